@@ -1,31 +1,145 @@
 import sqlite3
-from typing import Dict
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue
+from typing import Dict, Iterator, List, Set, Tuple
 from pathlib import Path
 
 
+# WAL is a property of the database file, so it only needs setting by the first connection
+DATABASE_PRAGMAS = "PRAGMA journal_mode=WAL;"
+
+# Per-connection settings, applied to every pooled connection right after it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL;"
+    "PRAGMA temp_store=MEMORY;"
+    "PRAGMA mmap_size=268435456;"
+    "PRAGMA cache_size=-65536;"
+)
+
+# Constant statement text so every table shares one prepared statement; pinned to the main
+# schema because TEMP tables exist on a single pooled connection and would otherwise shadow it
+TABLE_INFO_QUERY = 'SELECT name, type, "notnull", dflt_value, pk FROM pragma_table_info(?, \'main\')'
+
+# Tables per database whose column info is cached before that database's cache is reset
+MAX_CACHED_TABLES = 1024
+
+
 class ConnectionManager:
     """Manages SQLite database connections with connection pooling"""
-    
-    def __init__(self):
-        self.connections: Dict[str, sqlite3.Connection] = {}
-    
-    def get_connection(self, db_path: str) -> sqlite3.Connection:
-        """Get or create database connection"""
-        if db_path not in self.connections:
-            # Ensure directory exists
-            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-            self.connections[db_path] = sqlite3.connect(db_path, check_same_thread=False)
-            self.connections[db_path].row_factory = sqlite3.Row
-        return self.connections[db_path]
-    
+
+    def __init__(self, pool_size: int = 5, statement_cache_size: int = 512):
+        if pool_size < 1:
+            # A queue without connections would block every acquire() forever
+            raise ValueError(f"pool_size must be at least 1, got {pool_size}")
+        self.pool_size = pool_size
+        # Per-connection LRU of prepared statements, keyed by SQL text
+        self.statement_cache_size = statement_cache_size
+        self.pools: Dict[str, LifoQueue] = {}
+        self._pools_lock = threading.Lock()
+        self.journal_modes: Dict[str, str] = {}
+        self._ensured_dirs: Set[Path] = set()
+        # db_path -> table name -> (schema_version, TABLE_INFO_QUERY rows); any DDL bumps the version
+        self.table_columns: Dict[str, Dict[str, Tuple[int, List[tuple]]]] = {}
+
+    def _create_connection(self, db_path: str, first: bool = False) -> sqlite3.Connection:
+        """Open a new database connection with the pool's settings applied"""
+        # Rows are plain tuples; cursors that need access by column name opt into sqlite3.Row
+        conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=self.statement_cache_size)
+        if first:
+            try:
+                conn.executescript(DATABASE_PRAGMAS)
+            except sqlite3.OperationalError:
+                # Read-only files and mounts cannot switch to WAL but are still readable
+                pass
+            # WAL is silently refused for e.g. :memory: databases, so record what we actually got
+            self.journal_modes[db_path] = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        try:
+            conn.executescript(CONNECTION_PRAGMAS)
+        except sqlite3.OperationalError:
+            # These only tune performance, so a database that refuses them is used with defaults
+            pass
+        return conn
+
+    def _get_pool(self, db_path: str) -> LifoQueue:
+        """Get or create the connection pool for a database"""
+        pool = self.pools.get(db_path)
+        if pool is None:
+            with self._pools_lock:
+                pool = self.pools.get(db_path)
+                if pool is None:
+                    # Ensure directory exists, once per directory rather than per pool
+                    parent = Path(db_path).parent
+                    if parent not in self._ensured_dirs:
+                        parent.mkdir(parents=True, exist_ok=True)
+                        self._ensured_dirs.add(parent)
+                    # Every connection to :memory: is a separate database, so keep a single one
+                    size = 1 if db_path == ":memory:" else self.pool_size
+                    pool = LifoQueue(maxsize=size)
+                    try:
+                        for i in range(size):
+                            pool.put(self._create_connection(db_path, first=(i == 0)))
+                    except Exception:
+                        # Don't leak the connections opened before the failure
+                        self._drain(pool)
+                        self.journal_modes.pop(db_path, None)
+                        raise
+                    self.pools[db_path] = pool
+        return pool
+
+    @contextmanager
+    def acquire(self, db_path: str) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection from the pool, blocking until one is free.
+        
+        The connection belongs to the caller until the block exits, so statements that
+        make up one transaction cannot interleave with another thread's.
+        """
+        pool = self._get_pool(db_path)
+        conn = pool.get()
+        try:
+            yield conn
+        finally:
+            # Never hand a half-finished transaction to the next borrower
+            if conn.in_transaction:
+                conn.rollback()
+            pool.put(conn)
+
+    def get_table_columns(self, conn: sqlite3.Connection, db_path: str, table_name: str) -> List[tuple]:
+        """Get a table's TABLE_INFO_QUERY rows, re-reading them only after the schema changes"""
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        tables = self.table_columns.setdefault(db_path, {})
+        cached = tables.get(table_name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        columns = conn.execute(TABLE_INFO_QUERY, (table_name,)).fetchall()
+        # Missing tables are not cached, so misspelled names cannot grow the cache
+        if columns:
+            if len(tables) >= MAX_CACHED_TABLES and table_name not in tables:
+                tables.clear()
+            tables[table_name] = (version, columns)
+        return columns
+
     def close_connection(self, db_path: str) -> None:
-        """Close a specific database connection"""
-        if db_path in self.connections:
-            self.connections[db_path].close()
-            del self.connections[db_path]
-    
+        """Close all pooled connections for a specific database"""
+        with self._pools_lock:
+            pool = self.pools.pop(db_path, None)
+            self.journal_modes.pop(db_path, None)
+            self.table_columns.pop(db_path, None)
+        if pool is not None:
+            self._drain(pool)
+
     def close_all_connections(self) -> None:
         """Close all database connections"""
-        for conn in self.connections.values():
-            conn.close()
-        self.connections.clear()
\ No newline at end of file
+        with self._pools_lock:
+            pools = list(self.pools.values())
+            self.pools.clear()
+            self.journal_modes.clear()
+            self.table_columns.clear()
+        for pool in pools:
+            self._drain(pool)
+
+    @staticmethod
+    def _drain(pool: LifoQueue) -> None:
+        """Close every idle connection left in a pool"""
+        while not pool.empty():
+            pool.get_nowait().close()
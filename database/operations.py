@@ -1,125 +1,251 @@
+import hashlib
+import io
 import json
+import re
 import sqlite3
-from typing import List, Optional, Dict, Any
+import threading
+from typing import List, Optional, Dict, Any, Iterator, Set
 from .connection_manager import ConnectionManager
 
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+
+def format_column(col: tuple) -> Dict[str, Any]:
+    """Format a TABLE_INFO_QUERY row as column information"""
+    return {
+        "name": col[0],
+        "type": col[1],
+        "nullable": not col[2],
+        "default": col[3],
+        "primary_key": bool(col[4])
+    }
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for safe interpolation into SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _dumps(value: Any, indent: bool = False) -> str:
+    """Serialize a value as JSON, compact or indented by two spaces, using orjson when installed"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(value, default=str, option=option).decode()
+    if indent:
+        return json.dumps(value, indent=2, default=str)
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+# String and integer literals; masking them gives the shape of a query
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+# Distinct literal variants of one query shape before suggesting params
+LITERAL_REPEAT_THRESHOLD = 5
+
+# Query shapes remembered for the params suggestion before the history is reset
+MAX_TRACKED_SHAPES = 1024
+
+
+# Rows pulled from SQLite per fetchmany call when returning query results
+FETCH_BATCH_SIZE = 1000
+
+# Upper bound on rows returned by a single execute_query call
+DEFAULT_MAX_ROWS = 10_000
+
+
+def _digest(text: str) -> bytes:
+    """Fixed-size fingerprint of a query text for the params suggestion history"""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def _iter_rows(cursor: sqlite3.Cursor, limit: int) -> Iterator[tuple]:
+    """Yield at most limit rows from a cursor, fetching them in batches"""
+    remaining = limit
+    while remaining > 0:
+        batch = cursor.fetchmany(min(FETCH_BATCH_SIZE, remaining))
+        if not batch:
+            return
+        remaining -= len(batch)
+        yield from batch
+
 
 class DatabaseOperations:
     """Core database operations for SQLite databases"""
     
     def __init__(self, connection_manager: ConnectionManager):
         self.conn_manager = connection_manager
+        # Digest of the query shape -> digests of its distinct raw texts, capped just past the
+        # threshold; only fixed-size digests are kept so large literal-heavy queries are not pinned
+        self._literal_variants: Dict[bytes, Set[bytes]] = {}
+        self._literal_variants_lock = threading.Lock()
+    
+    def _parameterization_hint(self, query: str) -> str:
+        """Suggest params when the same query keeps arriving with different embedded literals.
+        
+        Each distinct literal compiles to a new prepared statement, so these queries never
+        hit the statement cache.
+        """
+        shape = _LITERAL_RE.sub('?', query)
+        if shape == query:
+            return ""
+        
+        shape_key = _digest(shape)
+        # Queries run on worker threads, so the read-modify-write must not interleave
+        with self._literal_variants_lock:
+            variants = self._literal_variants.get(shape_key)
+            if variants is None:
+                if len(self._literal_variants) >= MAX_TRACKED_SHAPES:
+                    self._literal_variants.clear()
+                variants = self._literal_variants[shape_key] = set()
+            if len(variants) <= LITERAL_REPEAT_THRESHOLD:
+                variants.add(_digest(query))
+            distinct = len(variants)
+        
+        if distinct <= LITERAL_REPEAT_THRESHOLD:
+            return ""
+        return (f"\nNote: this query has been run with more than {LITERAL_REPEAT_THRESHOLD} different literal values. "
+                f"Pass the values through params with ? placeholders so the prepared statement is reused.")
     
     def connect_database(self, db_path: str) -> str:
         """Connect to a SQLite database file and return table information"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            
-            if tables:
-                table_names = [table[0] for table in tables]
-                return f"Successfully connected to database: {db_path}\nTables found: {', '.join(table_names)}"
-            else:
-                return f"Successfully connected to database: {db_path}\nNo tables found in database."
+            with self.conn_manager.acquire(db_path) as conn:
+                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                table_names = [row[0] for row in cursor]
+                
+                journal_mode = self.conn_manager.journal_modes.get(db_path, "unknown")
+                
+                if table_names:
+                    return f"Successfully connected to database: {db_path} (journal mode: {journal_mode})\nTables found: {', '.join(table_names)}"
+                else:
+                    return f"Successfully connected to database: {db_path} (journal mode: {journal_mode})\nNo tables found in database."
         except Exception as e:
             return f"Error connecting to database: {str(e)}"
     
-    def execute_query(self, db_path: str, query: str, params: Optional[List] = None) -> str:
-        """Execute a SQL query on the database"""
+    def execute_query(self, db_path: str, query: str, params: Optional[List] = None,
+                      max_rows: int = DEFAULT_MAX_ROWS, pretty: bool = False) -> str:
+        """Execute a SQL query on the database, returning at most max_rows result rows.
+        
+        Rows are listed one compact JSON object per line unless pretty is set.
+        """
+        if max_rows < 1:
+            return f"Error executing query: max_rows must be at least 1, got {max_rows}"
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            # Auto-commit for non-SELECT queries
-            if not query.strip().upper().startswith('SELECT'):
-                conn.commit()
+            with self.conn_manager.acquire(db_path) as conn:
+                cursor = conn.cursor()
+                hint = "" if params else self._parameterization_hint(query)
+                
+                # Classify once from the first keyword, without copying the whole query
+                stripped = query.lstrip()
+                is_select = stripped[:6].upper() == 'SELECT' or stripped[:4].upper() == 'WITH'
                 
-            # Return results for SELECT queries
-            if query.strip().upper().startswith('SELECT'):
-                results = cursor.fetchall()
-                if results:
-                    columns = [description[0] for description in cursor.description]
-                    formatted_results = []
-                    for row in results:
-                        row_dict = dict(zip(columns, row))
-                        formatted_results.append(row_dict)
-                    return f"Query executed successfully.\nResults:\n{json.dumps(formatted_results, indent=2, default=str)}"
+                changes_before = conn.total_changes
+                if params:
+                    cursor.execute(query, params)
                 else:
-                    return "Query executed successfully. No results returned."
-            else:
+                    cursor.execute(query)
+                rows_affected = cursor.rowcount
+                
+                # WITH ... INSERT/UPDATE/DELETE has no result columns and must be committed too;
+                # rowcount stays -1 for statements starting with WITH, so count the changes instead
+                if is_select and cursor.description is None:
+                    is_select = False
+                    rows_affected = conn.total_changes - changes_before
+                
+                # Auto-commit for non-SELECT queries
+                if not is_select:
+                    conn.commit()
+                    
+                # Return results for SELECT queries
+                if is_select:
+                    columns = tuple(description[0] for description in cursor.description)
+                    
+                    # Encode row by row so only one fetch batch is held at a time
+                    output = io.StringIO()
+                    row_count = 0
+                    for row in _iter_rows(cursor, max_rows):
+                        output.write(",\n  " if row_count else "[\n  ")
+                        row_json = _dumps(dict(zip(columns, row)), indent=pretty)
+                        output.write(row_json.replace("\n", "\n  ") if pretty else row_json)
+                        row_count += 1
+                    
+                    if not row_count:
+                        return "Query executed successfully. No results returned." + hint
+                    output.write("\n]")
+                    
+                    result = f"Query executed successfully.\nResults:\n{output.getvalue()}"
+                    if cursor.fetchone() is not None:
+                        result += f"\nResults truncated to the first {max_rows} rows. Use LIMIT/OFFSET to page through the rest."
+                    return result + hint
+                else:
+                    return f"Query executed successfully. {rows_affected} rows affected." + hint
+        except Exception as e:
+            return f"Error executing query: {str(e)}"
+    
+    def execute_many(self, db_path: str, query: str, rows: List[List]) -> str:
+        """Execute a SQL statement once per parameter row in a single transaction"""
+        try:
+            with self.conn_manager.acquire(db_path) as conn:
+                cursor = conn.cursor()
+                # Take the write lock before the first row rather than upgrading mid-batch;
+                # a failure leaves the transaction open and acquire() rolls it back
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.executemany(query, rows)
+                conn.commit()
                 return f"Query executed successfully. {cursor.rowcount} rows affected."
         except Exception as e:
             return f"Error executing query: {str(e)}"
     
+    def stream_query(self, db_path: str, query: str, params: Optional[List] = None) -> Iterator[tuple]:
+        """Yield a query's column names, then each result row as a plain tuple.
+        
+        The connection stays borrowed until the generator is exhausted or closed.
+        Errors are raised rather than returned as messages.
+        """
+        with self.conn_manager.acquire(db_path) as conn:
+            cursor = conn.execute(query, params or ())
+            if cursor.description is None:
+                raise ValueError("Query does not return rows")
+            yield tuple(description[0] for description in cursor.description)
+            yield from cursor
+    
     def describe_table(self, db_path: str, table_name: str) -> str:
         """Get detailed information about a table structure"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            
-            # Get table schema
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            
-            if not columns:
-                return f"Table '{table_name}' not found."
-            
-            # Format column information
-            column_info = []
-            for col in columns:
-                col_dict = dict(col)
-                column_info.append({
-                    "name": col_dict["name"],
-                    "type": col_dict["type"],
-                    "nullable": not col_dict["notnull"],
-                    "default": col_dict["dflt_value"],
-                    "primary_key": bool(col_dict["pk"])
-                })
-            
-            # Get row count
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            row_count = cursor.fetchone()[0]
-            
-            return f"Table: {table_name}\nRow count: {row_count}\nColumns:\n{json.dumps(column_info, indent=2)}"
+            with self.conn_manager.acquire(db_path) as conn:
+                # Get table schema
+                columns = self.conn_manager.get_table_columns(conn, db_path, table_name)
+                
+                if not columns:
+                    return f"Table '{table_name}' not found."
+                
+                # Format column information
+                column_info = [format_column(col) for col in columns]
+                
+                # Get row count; the table is known to exist in main, so only quoting is needed
+                row_count = conn.execute(f"SELECT COUNT(*) FROM main.{quote_identifier(table_name)}").fetchone()[0]
+                
+                return f"Table: {table_name}\nRow count: {row_count}\nColumns:\n{_dumps(column_info, indent=True)}"
         except Exception as e:
             return f"Error describing table: {str(e)}"
     
     def get_table_names(self, db_path: str) -> List[str]:
         """Get list of table names in the database"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
-            return [table[0] for table in tables]
+            with self.conn_manager.acquire(db_path) as conn:
+                cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                return [row[0] for row in cursor]
         except Exception:
             return []
     
     def get_table_schema(self, db_path: str, table_name: str) -> List[Dict[str, Any]]:
         """Get table schema information"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            
-            schema = []
-            for col in columns:
-                col_dict = dict(col)
-                schema.append({
-                    "name": col_dict["name"],
-                    "type": col_dict["type"],
-                    "nullable": not col_dict["notnull"],
-                    "default": col_dict["dflt_value"],
-                    "primary_key": bool(col_dict["pk"])
-                })
-            return schema
+            with self.conn_manager.acquire(db_path) as conn:
+                columns = self.conn_manager.get_table_columns(conn, db_path, table_name)
+                return [format_column(col) for col in columns]
         except Exception:
             return []
\ No newline at end of file
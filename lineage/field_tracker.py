@@ -1,52 +1,255 @@
+import functools
 import re
-from typing import Dict, List, Optional
+import sqlite3
+import threading
+from itertools import groupby
+from typing import Dict, List, Optional, Set, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.scope import Scope, build_scope
+
+
+# Fallback patterns for SQL that sqlglot cannot parse; compiled once and
+# case-insensitive so the query never has to be upper-cased
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)', re.IGNORECASE)
+_FIELDS_RE = re.compile(r'SELECT\s+(.*?)\s+FROM', re.IGNORECASE | re.DOTALL)
+
+
+# One row per (target field, source field) pair; position keeps the source order
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lineage (
+    target_table TEXT NOT NULL,
+    target_field TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    source_table TEXT NOT NULL,
+    source_field TEXT NOT NULL,
+    join_condition TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (target_table, target_field, position)
+) WITHOUT ROWID
+"""
+
+_SELECT_COLUMNS = "SELECT target_table, target_field, source_table, source_field, join_condition FROM lineage"
+
+
+def _build_lineage(rows: List[tuple]) -> Dict:
+    """Fold the rows stored for one target field back into a lineage entry"""
+    target_table, target_field, _, _, join_condition = rows[0]
+    return {
+        "source_tables": [row[2] for row in rows],
+        "source_fields": [row[3] for row in rows],
+        "join_condition": join_condition,
+        "target_table": target_table,
+        "target_field": target_field
+    }
+
+
+# (tables, selected field names, (table, column) pairs the fields read from)
+QueryLineage = Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[Tuple[str, str], ...]]
+
+
+def _regex_query_lineage(query: str) -> QueryLineage:
+    """Best-effort table and field extraction for unparseable queries"""
+    tables = tuple(dict.fromkeys(_TABLE_RE.findall(query)))
+    match = _FIELDS_RE.search(query)
+    fields = tuple(f.strip() for f in match.group(1).split(',')) if match else ()
+    # Aliases cannot be resolved without a parse, so columns stay unqualified
+    columns = tuple(dict.fromkeys(('', f.split('.')[-1].strip()) for f in fields if f != '*'))
+    return tables, fields, columns
+
+
+def _resolve_column(scope: Scope, column: exp.Column, depth: int = 0) -> List[Tuple[str, str]]:
+    """Follow a column through CTE and subquery projections to the base table columns it reads.
+    
+    Columns whose source cannot be determined come back with an empty table.
+    """
+    # Only sources named in FROM/JOIN count; scope.sources also holds every visible CTE
+    selected = scope.selected_sources
+    if column.table:
+        source = selected[column.table][1] if column.table in selected else None
+    else:
+        # Without a schema an unqualified column can only be attributed when there is one source
+        source = next(iter(selected.values()))[1] if len(selected) == 1 else None
+    
+    if isinstance(source, exp.Table):
+        return [(source.name, column.name)]
+    # The depth limit stops recursive CTEs, which reference themselves, from looping
+    if not isinstance(source, Scope) or depth > 32:
+        return [('', column.name)]
+    
+    # A UNION contributes the matching projection of every branch (union_scopes before sqlglot 26)
+    branches = getattr(source, "set_operation_scopes", None) or getattr(source, "union_scopes", None) or [source]
+    resolved = []
+    for branch in branches:
+        projection = next(
+            (e for e in branch.expression.selects if e.alias_or_name == column.name), None
+        )
+        if projection is None:
+            resolved.append(('', column.name))
+            continue
+        resolved.extend(
+            pair for inner in projection.find_all(exp.Column) if not inner.is_star
+            for pair in _resolve_column(branch, inner, depth + 1)
+        )
+    return resolved
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_query_lineage(query: str) -> QueryLineage:
+    """Parse a query once and return its source tables, selected fields and their columns"""
+    try:
+        tree = sqlglot.parse_one(query, read="sqlite")
+    except SqlglotError:
+        return _regex_query_lineage(query)
+    
+    # CTE references parse as tables too, but they are not real data sources
+    cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+    source_tables = [table for table in tree.find_all(exp.Table) if table.name not in cte_names]
+    tables = tuple(dict.fromkeys(table.name for table in source_tables))
+    
+    # The outermost SELECT determines the fields the query produces; aliases and plain
+    # columns are reported by name, anything else such as COUNT(*) by its SQL text
+    select = tree.find(exp.Select)
+    expressions = select.expressions if select else []
+    fields = tuple(
+        e.alias_or_name if isinstance(e, exp.Alias) or (isinstance(e, exp.Column) and not e.is_star)
+        else e.sql(dialect="sqlite")
+        for e in expressions
+    )
+    
+    # Resolve columns through table aliases and into CTEs and derived tables, each in the
+    # scope of the SELECT it appears in so scalar subqueries resolve against their own FROM
+    try:
+        root = build_scope(tree) if select else None
+    except SqlglotError:
+        root = None
+    scopes = {id(scope.expression): scope for scope in root.traverse()} if root else {}
+    columns = []
+    for e in expressions:
+        for column in e.find_all(exp.Column):
+            if column.is_star:
+                continue
+            scope = scopes.get(id(column.find_ancestor(exp.Select)))
+            columns.extend(_resolve_column(scope, column) if scope else [('', column.name)])
+    columns = tuple(dict.fromkeys(columns))
+    
+    return tables, fields, columns
 
 
 class FieldTracker:
     """Track field lineage and data sources"""
     
-    def __init__(self):
-        self.lineage_db: Dict[str, Dict] = {}
+    def __init__(self, db_path: str = ":memory:"):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        try:
+            self.conn.execute(_SCHEMA)
+        except sqlite3.Error:
+            self.conn.close()
+            raise
+        # The connection is shared by the worker threads running lineage tools
+        self._lock = threading.RLock()
+        # Formatted trace_field_lineage reports, dropped whenever the field's lineage changes
+        self._fmt_cache: Dict[Tuple[str, str], str] = {}
     
     def add_lineage(self, target_table: str, target_field: str, 
                    source_tables: List[str], source_fields: List[str], 
                    join_condition: str = "") -> None:
-        """Add field lineage information"""
-        key = f"{target_table}.{target_field}"
-        self.lineage_db[key] = {
-            "source_tables": source_tables,
-            "source_fields": source_fields,
-            "join_condition": join_condition,
-            "target_table": target_table,
-            "target_field": target_field
-        }
+        """Add field lineage information, replacing any previous entry for the field"""
+        if len(source_tables) != len(source_fields):
+            raise ValueError("source_tables and source_fields must have the same length")
+        if not source_tables:
+            # Writing no sources would silently delete the field's existing lineage
+            raise ValueError("at least one source field is required")
+        
+        with self._lock:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM lineage WHERE target_table = ? AND target_field = ?",
+                    (target_table, target_field)
+                )
+                self.conn.executemany(
+                    "INSERT INTO lineage VALUES (?, ?, ?, ?, ?, ?)",
+                    [(target_table, target_field, position, source_table, source_field, join_condition)
+                     for position, (source_table, source_field) in enumerate(zip(source_tables, source_fields))]
+                )
+            self._fmt_cache.pop((target_table, target_field), None)
     
     def get_lineage(self, table: str, field: str) -> Optional[Dict]:
         """Get lineage information for a field"""
-        key = f"{table}.{field}"
-        return self.lineage_db.get(key)
-    
-    def analyze_query_lineage(self, query: str) -> Dict[str, List[str]]:
-        """Analyze a query to extract potential lineage"""
-        # Simple regex-based analysis (can be enhanced with proper SQL parser)
-        tables = re.findall(r'FROM\s+(\w+)|JOIN\s+(\w+)', query.upper())
-        table_list = [t[0] or t[1] for t in tables]
+        with self._lock:
+            rows = self.conn.execute(
+                f"{_SELECT_COLUMNS} WHERE target_table = ? AND target_field = ? ORDER BY position",
+                (table, field)
+            ).fetchall()
+        return _build_lineage(rows) if rows else None
+    
+    def format_lineage(self, table: str, field: str) -> Optional[str]:
+        """Get a printable lineage report for a field, or None if it has no lineage"""
+        key = (table, field)
+        cached = self._fmt_cache.get(key)
+        if cached is not None:
+            return cached
         
-        fields = re.findall(r'SELECT\s+(.*?)\s+FROM', query.upper(), re.DOTALL)
-        if fields:
-            field_list = [f.strip() for f in fields[0].split(',')]
-        else:
-            field_list = []
+        # Held across lookup and caching so a concurrent add_lineage cannot be cached over
+        with self._lock:
+            lineage = self.get_lineage(table, field)
+            if not lineage:
+                return None
+            
+            result = f"Field Lineage for {table}.{field}:\n"
+            result += f"Source Tables: {', '.join(lineage['source_tables'])}\n"
+            result += f"Source Fields: {', '.join(lineage['source_fields'])}\n"
+            
+            if lineage['join_condition']:
+                result += f"Join Condition: {lineage['join_condition']}\n"
+            
+            result += "\nData Flow:\n"
+            for src_table, src_field in zip(lineage['source_tables'], lineage['source_fields']):
+                result += f"  {src_table}.{src_field} -> {table}.{field}\n"
+            
+            self._fmt_cache[key] = result
+            return result
+    
+    def get_tracked_fields(self, tables: List[str]) -> Set[Tuple[str, str]]:
+        """Get the (table, field) pairs with recorded lineage among the given tables"""
+        if not tables:
+            return set()
+        placeholders = ','.join('?' for _ in tables)
+        with self._lock:
+            cursor = self.conn.execute(
+                f"SELECT DISTINCT target_table, target_field FROM lineage WHERE target_table IN ({placeholders})",
+                tables
+            )
+            return set(cursor)
+    
+    def analyze_query_lineage(self, query: str) -> Dict[str, List]:
+        """Analyze a query to extract potential lineage.
         
+        "columns" lists the (table, column) pairs the selected fields read from;
+        the table is empty when it could not be determined.
+        """
+        # Only surrounding whitespace is stripped for the cache key; inner whitespace
+        # may sit inside string literals, which would change what the query selects
+        tables, fields, columns = _parse_query_lineage(query.strip())
         return {
-            "tables": table_list,
-            "fields": field_list
+            "tables": list(tables),
+            "fields": list(fields),
+            "columns": list(columns)
         }
     
     def get_all_lineage(self) -> Dict[str, Dict]:
         """Get all lineage information"""
-        return self.lineage_db.copy()
+        with self._lock:
+            cursor = self.conn.execute(f"{_SELECT_COLUMNS} ORDER BY target_table, target_field, position")
+            return {
+                f"{target_table}.{target_field}": _build_lineage(list(rows))
+                for (target_table, target_field), rows in groupby(cursor, key=lambda row: row[:2])
+            }
     
     def clear_lineage(self) -> None:
         """Clear all lineage information"""
-        self.lineage_db.clear()
\ No newline at end of file
+        with self._lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM lineage")
+            self._fmt_cache.clear()
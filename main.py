@@ -1,20 +1,37 @@
+import asyncio
+import os
+import sqlite3
+import warnings
 from typing import List, Optional
 from mcp.server.fastmcp import FastMCP
 
 from database.connection_manager import ConnectionManager
-from database.operations import DatabaseOperations
+from database.operations import DatabaseOperations, DEFAULT_MAX_ROWS
 from lineage.field_tracker import FieldTracker
 from utils.import_export import ImportExportUtils
 from utils.data_generator import DataGenerator
 
 
+def _open_field_tracker() -> FieldTracker:
+    """Open the lineage store, falling back to memory so an unwritable path cannot stop the server"""
+    lineage_db = os.environ.get(
+        "SQLITE_MCP_LINEAGE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lineage.db")
+    )
+    try:
+        return FieldTracker(lineage_db)
+    except sqlite3.Error as e:
+        # stdout carries the MCP protocol, so warnings (stderr) are the only safe channel here
+        warnings.warn(f"Cannot open lineage database {lineage_db} ({e}); lineage will not persist")
+        return FieldTracker(":memory:")
+
+
 # Initialize FastMCP server
 mcp = FastMCP("sqlite-db")
 
 # Initialize components
-connection_manager = ConnectionManager()
+connection_manager = ConnectionManager(pool_size=int(os.environ.get("SQLITE_MCP_POOL_SIZE", "5")))
 db_operations = DatabaseOperations(connection_manager)
-field_tracker = FieldTracker()
+field_tracker = _open_field_tracker()
 import_export = ImportExportUtils(connection_manager)
 data_generator = DataGenerator(connection_manager)
 
@@ -26,19 +43,37 @@ async def connect_database(db_path: str) -> str:
     Args:
         db_path: Path to the SQLite database file
     """
-    return db_operations.connect_database(db_path)
+    return await asyncio.to_thread(db_operations.connect_database, db_path)
 
 
 @mcp.tool()
-async def execute_query(db_path: str, query: str, params: Optional[List] = None) -> str:
+async def execute_query(db_path: str, query: str, params: Optional[List] = None,
+                        max_rows: int = DEFAULT_MAX_ROWS, pretty: bool = False) -> str:
     """Execute a SQL query on the database.
     
     Args:
         db_path: Path to the SQLite database file
         query: SQL query to execute
         params: Optional parameters for the query
+        max_rows: Maximum number of result rows to return (default: 10000)
+        pretty: Indent each result row instead of printing it on one line
     """
-    return db_operations.execute_query(db_path, query, params)
+    return await asyncio.to_thread(db_operations.execute_query, db_path, query, params, max_rows, pretty)
+
+
+@mcp.tool()
+async def execute_many(db_path: str, query: str, rows: List[List]) -> str:
+    """Execute a SQL statement once for each set of parameters, in a single transaction.
+    
+    Prefer this over repeated execute_query calls when inserting more than about 50 rows:
+    the statement is prepared once and committed once.
+    
+    Args:
+        db_path: Path to the SQLite database file
+        query: Parameterized SQL statement to execute
+        rows: List of parameter lists, one per execution
+    """
+    return await asyncio.to_thread(db_operations.execute_many, db_path, query, rows)
 
 
 @mcp.tool()
@@ -49,7 +84,7 @@ async def describe_table(db_path: str, table_name: str) -> str:
         db_path: Path to the SQLite database file
         table_name: Name of the table to describe
     """
-    return db_operations.describe_table(db_path, table_name)
+    return await asyncio.to_thread(db_operations.describe_table, db_path, table_name)
 
 
 @mcp.tool()
@@ -66,7 +101,8 @@ async def add_field_lineage(target_table: str, target_field: str,
         join_condition: Optional join condition description
     """
     try:
-        field_tracker.add_lineage(
+        await asyncio.to_thread(
+            field_tracker.add_lineage,
             target_table, target_field, 
             source_tables, source_fields, 
             join_condition
@@ -85,23 +121,11 @@ async def trace_field_lineage(table: str, field: str) -> str:
         field: Field name to trace
     """
     try:
-        lineage = field_tracker.get_lineage(table, field)
+        result = await asyncio.to_thread(field_tracker.format_lineage, table, field)
         
-        if not lineage:
+        if result is None:
             return f"No lineage information found for {table}.{field}"
         
-        result = f"Field Lineage for {table}.{field}:\n"
-        result += f"Source Tables: {', '.join(lineage['source_tables'])}\n"
-        result += f"Source Fields: {', '.join(lineage['source_fields'])}\n"
-        
-        if lineage['join_condition']:
-            result += f"Join Condition: {lineage['join_condition']}\n"
-        
-        # Try to provide sample data mapping
-        result += f"\nData Flow:\n"
-        for i, (src_table, src_field) in enumerate(zip(lineage['source_tables'], lineage['source_fields'])):
-            result += f"  {src_table}.{src_field} -> {table}.{field}\n"
-        
         return result
     except Exception as e:
         return f"Error tracing lineage: {str(e)}"
@@ -115,21 +139,22 @@ async def analyze_query_lineage(query: str) -> str:
         query: SQL query to analyze
     """
     try:
-        analysis = field_tracker.analyze_query_lineage(query)
+        analysis = await asyncio.to_thread(field_tracker.analyze_query_lineage, query)
         
         result = "Query Analysis:\n"
         result += f"Tables involved: {', '.join(analysis['tables'])}\n"
         result += f"Fields selected: {', '.join(analysis['fields'])}\n"
         
         # Check if we have lineage information for any of the fields
-        lineage_found = []
-        for table in analysis['tables']:
-            for field in analysis['fields']:
-                if field != '*':  # Skip wildcard
-                    clean_field = field.split('.')[-1].strip()  # Get field name without table prefix
-                    lineage = field_tracker.get_lineage(table, clean_field)
-                    if lineage:
-                        lineage_found.append(f"{table}.{clean_field}")
+        # Columns whose table is known are checked against it alone, the rest against every table;
+        # dedupe the pairs and check them all against one lookup of the tracked fields
+        candidates = dict.fromkeys(
+            (table, field)
+            for qualifier, field in analysis['columns']
+            for table in ([qualifier] if qualifier else analysis['tables'])
+        )
+        tracked = await asyncio.to_thread(field_tracker.get_tracked_fields, analysis['tables'])
+        lineage_found = [f"{table}.{field}" for table, field in candidates if (table, field) in tracked]
         
         if lineage_found:
             result += f"\nFields with tracked lineage: {', '.join(lineage_found)}"
@@ -150,7 +175,7 @@ async def generate_sample_data(db_path: str, table_name: str, num_rows: int = 10
         table_name: Name of the table to populate
         num_rows: Number of rows to generate (default: 10)
     """
-    return data_generator.generate_sample_data(db_path, table_name, num_rows)
+    return await asyncio.to_thread(data_generator.generate_sample_data, db_path, table_name, num_rows)
 
 
 @mcp.tool()
@@ -163,7 +188,7 @@ async def import_csv(db_path: str, csv_path: str, table_name: str, create_table:
         table_name: Name of the target table
         create_table: Whether to create the table if it doesn't exist
     """
-    return import_export.import_csv(db_path, csv_path, table_name, create_table)
+    return await asyncio.to_thread(import_export.import_csv, db_path, csv_path, table_name, create_table)
 
 
 @mcp.tool()
@@ -175,7 +200,7 @@ async def export_table_to_csv(db_path: str, table_name: str, output_path: str) -
         table_name: Name of the table to export
         output_path: Path for the output CSV file
     """
-    return import_export.export_table_to_csv(db_path, table_name, output_path)
+    return await asyncio.to_thread(import_export.export_table_to_csv, db_path, table_name, output_path)
 
 
 if __name__ == "__main__":
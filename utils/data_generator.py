@@ -1,7 +1,26 @@
 import random
-from typing import List, Tuple, Dict, Any
+from functools import partial
+from typing import Callable, List, Tuple, Dict, Any
 from faker import Faker
+try:
+    import numpy as np
+except ImportError:  # optional: numeric columns fall back to the random module
+    np = None
 from database.connection_manager import ConnectionManager
+from database.operations import format_column, quote_identifier
+
+
+# Shared by every generator; numeric columns are drawn in batches from these
+_rng = random.Random()
+_np_rng = np.random.default_rng() if np is not None else None
+
+_INT_VALUES = range(1, 1001)
+_BOOL_VALUES = (0, 1)
+
+
+def _repeat(generate: Callable[[], Any]) -> Callable[[int], List[Any]]:
+    """Turn a single-value generator into one producing a list of n values"""
+    return lambda n: [generate() for _ in range(n)]
 
 
 class DataGenerator:
@@ -9,120 +28,100 @@ class DataGenerator:
     
     def __init__(self, connection_manager: ConnectionManager):
         self.conn_manager = connection_manager
-        self.fake = Faker()
+        # Unweighted locale data trades realistic value frequencies for much cheaper lookups
+        self.fake = Faker(use_weighting=False)
+        # Checked in order against the lowercased column name; the first matching pattern wins
+        self._text_generators = (
+            ('name', self.fake.name),
+            ('email', self.fake.email),
+            ('phone', self.fake.phone_number),
+            ('address', self.fake.address),
+            ('company', self.fake.company),
+            ('city', self.fake.city),
+            ('country', self.fake.country),
+            ('title', self.fake.job),
+            ('description', partial(self.fake.text, max_nb_chars=100)),
+        )
+        self._short_text = partial(self.fake.text, max_nb_chars=50)
     
     def generate_sample_data(self, db_path: str, table_name: str, num_rows: int = 10) -> str:
         """Generate and insert sample data into a table based on column types"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            
-            # Get table schema
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            
-            if not columns:
-                return f"Table '{table_name}' not found."
-            
-            # Generate data based on column types
-            insert_data = []
-            
-            for _ in range(num_rows):
-                row_data = []
-                for col in columns:
-                    col_dict = dict(col)
-                    column_name = col_dict["name"]
-                    column_type = col_dict["type"].upper()
-                    is_pk = bool(col_dict["pk"])
-                    
-                    # Generate data based on type
-                    if is_pk and 'INTEGER' in column_type:
-                        # Skip auto-increment primary keys
-                        continue
-                    else:
-                        value = self._generate_value_by_type(column_name, column_type)
-                        row_data.append(value)
+            with self.conn_manager.acquire(db_path) as conn:
+                # Get table schema
+                columns = self.conn_manager.get_table_columns(conn, db_path, table_name)
+                
+                if not columns:
+                    return f"Table '{table_name}' not found."
                 
-                insert_data.append(tuple(row_data))
-            
-            # Filter out auto-increment columns from column names
-            filtered_columns = []
-            for col in columns:
-                col_dict = dict(col)
-                is_pk = bool(col_dict["pk"])
-                column_type = col_dict["type"].upper()
-                if not (is_pk and 'INTEGER' in column_type):
-                    filtered_columns.append(col_dict["name"])
-            
-            # Insert data
-            placeholders = ','.join(['?' for _ in filtered_columns])
-            insert_query = f"INSERT INTO {table_name} ({','.join(filtered_columns)}) VALUES ({placeholders})"
-            
-            cursor.executemany(insert_query, insert_data)
-            conn.commit()
-            
-            return f"Successfully generated and inserted {num_rows} rows into {table_name}"
+                # Pick each column's generator once, generate whole columns, then zip them into rows;
+                # executemany consumes the zip directly, so no list of row tuples is built
+                filtered_columns, generators = self._compile_generators(columns)
+                columns_data = [generator(num_rows) for generator in generators]
+                insert_data = zip(*columns_data)
+                
+                # Insert data into the main-schema table the columns were read from
+                placeholders = ','.join(['?' for _ in filtered_columns])
+                insert_query = f"INSERT INTO main.{quote_identifier(table_name)} ({','.join(map(quote_identifier, filtered_columns))}) VALUES ({placeholders})"
+                
+                # Take the write lock before the first row rather than upgrading it mid-batch
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(insert_query, insert_data)
+                conn.commit()
+                
+                return f"Successfully generated and inserted {num_rows} rows into {table_name}"
         except Exception as e:
             return f"Error generating data: {str(e)}"
     
-    def _generate_value_by_type(self, column_name: str, column_type: str) -> Any:
-        """Generate a value based on column name and type"""
-        column_name_lower = column_name.lower()
-        
+    def _compile_generators(self, columns: List[tuple]) -> Tuple[List[str], List[Callable[[int], List[Any]]]]:
+        """Choose a column generator for each column, skipping auto-increment primary keys"""
+        column_names = []
+        generators = []
+        for name, column_type, _, _, pk in columns:
+            column_type = column_type.upper()
+            if pk and 'INTEGER' in column_type:
+                # Skip auto-increment primary keys
+                continue
+            column_names.append(name)
+            generators.append(self._generator_for_type(name, column_type))
+        return column_names, generators
+    
+    def _generator_for_type(self, column_name: str, column_type: str) -> Callable[[int], List[Any]]:
+        """Get a generator producing a whole column of n values based on column name and type"""
+        rng = _np_rng
         if 'INT' in column_type:
-            return random.randint(1, 1000)
+            if rng is not None:
+                return lambda n: rng.integers(1, 1001, size=n).tolist()
+            return lambda n: _rng.choices(_INT_VALUES, k=n)
         elif 'REAL' in column_type or 'FLOAT' in column_type or 'DOUBLE' in column_type:
-            return round(random.uniform(1.0, 1000.0), 2)
+            if rng is not None:
+                return lambda n: np.round(rng.uniform(1.0, 1000.0, size=n), 2).tolist()
+            uniform = _rng.uniform
+            return _repeat(lambda: round(uniform(1.0, 1000.0), 2))
         elif 'TEXT' in column_type or 'VARCHAR' in column_type or 'CHAR' in column_type:
-            return self._generate_text_value(column_name_lower)
+            return _repeat(self._text_generator(column_name.lower()))
         elif 'DATE' in column_type or 'DATETIME' in column_type:
-            return self.fake.date_time().isoformat()
+            date_time = self.fake.date_time
+            return _repeat(lambda: date_time().isoformat())
         elif 'BOOL' in column_type:
-            return random.choice([0, 1])
+            if rng is not None:
+                return lambda n: rng.integers(0, 2, size=n).tolist()
+            return lambda n: _rng.choices(_BOOL_VALUES, k=n)
         else:
-            return self.fake.text(max_nb_chars=20)
+            return _repeat(partial(self.fake.text, max_nb_chars=20))
     
-    def _generate_text_value(self, column_name: str) -> str:
-        """Generate text value based on column name patterns"""
-        if 'name' in column_name:
-            return self.fake.name()
-        elif 'email' in column_name:
-            return self.fake.email()
-        elif 'phone' in column_name:
-            return self.fake.phone_number()
-        elif 'address' in column_name:
-            return self.fake.address()
-        elif 'company' in column_name:
-            return self.fake.company()
-        elif 'city' in column_name:
-            return self.fake.city()
-        elif 'country' in column_name:
-            return self.fake.country()
-        elif 'title' in column_name:
-            return self.fake.job()
-        elif 'description' in column_name:
-            return self.fake.text(max_nb_chars=100)
-        else:
-            return self.fake.text(max_nb_chars=50)
+    def _text_generator(self, column_name: str) -> Callable[[], str]:
+        """Get a text generator based on column name patterns"""
+        for pattern, generate in self._text_generators:
+            if pattern in column_name:
+                return generate
+        return self._short_text
     
     def get_table_schema_for_generation(self, db_path: str, table_name: str) -> List[Dict[str, Any]]:
         """Get table schema information for data generation"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns = cursor.fetchall()
-            
-            schema = []
-            for col in columns:
-                col_dict = dict(col)
-                schema.append({
-                    "name": col_dict["name"],
-                    "type": col_dict["type"],
-                    "nullable": not col_dict["notnull"],
-                    "default": col_dict["dflt_value"],
-                    "primary_key": bool(col_dict["pk"])
-                })
-            return schema
+            with self.conn_manager.acquire(db_path) as conn:
+                columns = self.conn_manager.get_table_columns(conn, db_path, table_name)
+                return [format_column(col) for col in columns]
         except Exception:
             return []
\ No newline at end of file
@@ -1,7 +1,44 @@
 import os
+import re
 import csv
-from typing import List
+from contextlib import closing
+from itertools import chain, islice
+from typing import Iterable, Iterator, List, Optional
 from database.connection_manager import ConnectionManager
+from database.operations import DatabaseOperations, quote_identifier
+
+
+# Rows read from the start of a CSV file to infer column types
+TYPE_SAMPLE_ROWS = 100
+
+# Numbers with leading zeros (ZIP codes, IDs) deliberately do not match and stay text
+_INTEGER_RE = re.compile(r'[+-]?(?:0|[1-9][0-9]*)')
+_REAL_RE = re.compile(r'[+-]?(?:(?:0|[1-9][0-9]*)(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?')
+
+
+def _infer_column_type(values: Iterable[Optional[str]]) -> str:
+    """Pick the most specific type that every non-empty sampled value fits"""
+    column_type = None
+    for value in values:
+        if not value:
+            continue
+        if column_type in (None, "INTEGER") and _INTEGER_RE.fullmatch(value):
+            column_type = "INTEGER"
+        elif _REAL_RE.fullmatch(value):
+            column_type = "REAL"
+        else:
+            return "TEXT"
+    return column_type or "TEXT"
+
+
+def _fit_rows(reader: Iterator[List[str]], width: int) -> Iterator[List[str]]:
+    """Skip blank CSV lines and pad or trim the rest to the header width"""
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != width:
+            row = row[:width] + [None] * (width - len(row))
+        yield row
 
 
 class ImportExportUtils:
@@ -9,6 +46,7 @@ class ImportExportUtils:
     
     def __init__(self, connection_manager: ConnectionManager):
         self.conn_manager = connection_manager
+        self.db_operations = DatabaseOperations(connection_manager)
     
     def import_csv(self, db_path: str, csv_path: str, table_name: str, create_table: bool = True) -> str:
         """Import data from a CSV file into a SQLite table"""
@@ -16,110 +54,93 @@ class ImportExportUtils:
             if not os.path.exists(csv_path):
                 return f"CSV file not found: {csv_path}"
             
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            
-            # Read CSV file
-            with open(csv_path, 'r', encoding='utf-8') as csvfile:
-                # Detect delimiter
-                sample = csvfile.read(1024)
-                csvfile.seek(0)
-                sniffer = csv.Sniffer()
-                delimiter = sniffer.sniff(sample).delimiter
-                
-                reader = csv.DictReader(csvfile, delimiter=delimiter)
-                rows = list(reader)
-                
-                if not rows:
-                    return "CSV file is empty"
-                
-                headers = list(rows[0].keys())
+            with self.conn_manager.acquire(db_path) as conn:
+                cursor = conn.cursor()
                 
-                if create_table:
-                    # Create table based on CSV headers
-                    # Simple type inference based on first row
-                    column_defs = []
-                    first_row = rows[0]
+                # Read CSV file
+                with open(csv_path, 'r', encoding='utf-8') as csvfile:
+                    # Detect delimiter
+                    sample = csvfile.read(1024)
+                    csvfile.seek(0)
+                    sniffer = csv.Sniffer()
+                    delimiter = sniffer.sniff(sample).delimiter
                     
-                    for header in headers:
-                        value = first_row[header]
-                        # Simple type inference
-                        if value.isdigit():
-                            column_type = "INTEGER"
-                        elif value.replace('.', '').replace('-', '').isdigit():
-                            column_type = "REAL"
-                        else:
-                            column_type = "TEXT"
+                    reader = csv.reader(csvfile, delimiter=delimiter)
+                    headers = next(reader, None)
+                    rows = _fit_rows(reader, len(headers)) if headers else iter(())
+                    # Buffer the first rows for type inference; they are inserted ahead of the rest
+                    sample_rows = list(islice(rows, TYPE_SAMPLE_ROWS))
+                    
+                    if not sample_rows:
+                        return "CSV file is empty"
+                    
+                    # One explicit transaction covers the table creation and every insert
+                    cursor.execute("BEGIN")
+                    
+                    if create_table:
+                        # Create table based on CSV headers, typing each column from the sampled rows
+                        column_defs = []
                         
-                        column_defs.append(f"{header} {column_type}")
+                        for header, values in zip(headers, zip(*sample_rows)):
+                            column_defs.append(f"{quote_identifier(header)} {_infer_column_type(values)}")
+                        
+                        create_query = f"CREATE TABLE IF NOT EXISTS {quote_identifier(table_name)} ({', '.join(column_defs)})"
+                        cursor.execute(create_query)
                     
-                    create_query = f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(column_defs)})"
-                    cursor.execute(create_query)
-                
-                # Insert data
-                placeholders = ','.join(['?' for _ in headers])
-                insert_query = f"INSERT INTO {table_name} ({','.join(headers)}) VALUES ({placeholders})"
-                
-                for row in rows:
-                    values = [row[header] for header in headers]
-                    cursor.execute(insert_query, values)
-                
-                conn.commit()
-                
-                return f"Successfully imported {len(rows)} rows from {csv_path} into {table_name}"
+                    # Insert data, streaming the remaining rows straight from the reader
+                    placeholders = ','.join(['?' for _ in headers])
+                    insert_query = f"INSERT INTO {quote_identifier(table_name)} ({','.join(map(quote_identifier, headers))}) VALUES ({placeholders})"
+                    
+                    cursor.executemany(insert_query, chain(sample_rows, rows))
+                    row_count = cursor.rowcount
+                    conn.commit()
+                    
+                    return f"Successfully imported {row_count} rows from {csv_path} into {table_name}"
         except Exception as e:
             return f"Error importing CSV: {str(e)}"
     
-    def export_table_to_csv(self, db_path: str, table_name: str, output_path: str) -> str:
-        """Export a table to a CSV file"""
-        try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
+    def _export_rows(self, db_path: str, query: str, output_path: str) -> int:
+        """Stream query results into a CSV file and return the number of rows written.
+        
+        Nothing is written when the query returns no rows.
+        """
+        with closing(self.db_operations.stream_query(db_path, query)) as rows:
+            columns = next(rows)
+            first_row = next(rows, None)
+            if first_row is None:
+                return 0
             
-            cursor.execute(f"SELECT * FROM {table_name}")
-            rows = cursor.fetchall()
+            row_count = 0
             
-            if not rows:
-                return f"Table {table_name} is empty"
-            
-            # Get column names
-            columns = [description[0] for description in cursor.description]
+            def counted(source: Iterable[tuple]) -> Iterator[tuple]:
+                nonlocal row_count
+                for row in source:
+                    row_count += 1
+                    yield row
             
-            # Write to CSV
+            # One writerows call instead of a writerow call per row
             with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
                 writer = csv.writer(csvfile)
                 writer.writerow(columns)
-                
-                for row in rows:
-                    writer.writerow(row)
-            
-            return f"Successfully exported {len(rows)} rows from {table_name} to {output_path}"
+                writer.writerows(counted(chain((first_row,), rows)))
+            return row_count
+    
+    def export_table_to_csv(self, db_path: str, table_name: str, output_path: str) -> str:
+        """Export a table to a CSV file"""
+        try:
+            row_count = self._export_rows(db_path, f"SELECT * FROM {quote_identifier(table_name)}", output_path)
+            if not row_count:
+                return f"Table {table_name} is empty"
+            return f"Successfully exported {row_count} rows from {table_name} to {output_path}"
         except Exception as e:
             return f"Error exporting table: {str(e)}"
     
     def export_query_to_csv(self, db_path: str, query: str, output_path: str) -> str:
         """Export query results to a CSV file"""
         try:
-            conn = self.conn_manager.get_connection(db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            if not rows:
+            row_count = self._export_rows(db_path, query, output_path)
+            if not row_count:
                 return "Query returned no results"
-            
-            # Get column names
-            columns = [description[0] for description in cursor.description]
-            
-            # Write to CSV
-            with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(columns)
-                
-                for row in rows:
-                    writer.writerow(row)
-            
-            return f"Successfully exported {len(rows)} rows from query to {output_path}"
+            return f"Successfully exported {row_count} rows from query to {output_path}"
         except Exception as e:
-            return f"Error exporting query: {str(e)}"
\ No newline at end of file
+            return f"Error exporting query: {str(e)}"